@@ -3,15 +3,47 @@ import pandas as pd
 import plotly.express as px
 from repository import SisuRepository
 from providers.fredao_provider import FredaoProvider
+from providers.coalescing import CoalescingProvider
 
 # --- UI CONFIGURATION ---
 st.set_page_config(page_title="SISU Analytics", layout="wide", page_icon="📊")
 
+# Specialist partial scores change at most daily: written-through rows are served
+# from SQLite for this long before a course is fetched live again
+LIVE_DB_REFRESH_SECONDS = 6 * 60 * 60
+
+@st.cache_resource
+def get_live_provider():
+    """Single provider shared by all sessions, so identical live fetches are coalesced."""
+    return CoalescingProvider(FredaoProvider())
+
+def live_rows_to_records(rows, course_id, course_name):
+    """Maps specialist rowData (PARCIAL_DIA1..4) to normalized history records."""
+    records = []
+    for r in rows or []:
+        # Map partial day keys to specific calendar dates
+        for i in range(1, 5):
+            day_key, date_str = f"PARCIAL_DIA{i}", f"{19+i}/01"
+            score = r.get(day_key)
+            if score:
+                records.append({
+                    'curso': course_name.upper().strip(),
+                    'universidade': str(r.get('SIGLA')).upper().strip(),
+                    'cidade': str(r.get('MUNICIPIO_CAMPUS')).upper().strip(),
+                    'uf': str(r.get('SG_UF_CAMPUS')).upper().strip(),
+                    'date': date_str,
+                    'score': float(score),
+                    'fonte': 'LIVE_API',
+                    'course_id': course_id
+                })
+    return records
+
 def get_unified_data(selected_ids, selected_names_map, repository, provider):
     """
     Hybrid data fetcher:
     1. Fetches priority data from the local SQLite (Top 17 courses).
-    2. Fetches missing courses on-demand from the Specialist API.
+    2. Fetches missing courses on-demand from the Specialist API
+       (coalesced across sessions and written through to SQLite).
     3. Normalizes strings and deduplicates entries prioritizing verified data.
     """
     # 1. Database retrieval
@@ -23,9 +55,13 @@ def get_unified_data(selected_ids, selected_names_map, repository, provider):
         df_db['universidade'] = df_db['universidade'].str.upper().str.strip()
         df_db['cidade'] = df_db['cidade'].str.upper().str.strip()
     
-    # Identify missing IDs not found in local DB
+    # Identify missing IDs not found in local DB, plus live-only courses due for a refresh
     found_ids = df_db['course_id'].unique().tolist() if not df_db.empty else []
-    missing_ids = [str(cid).strip() for cid in selected_ids if str(cid).strip() not in found_ids]
+    stale_ids = repository.get_stale_live_course_ids(found_ids, LIVE_DB_REFRESH_SECONDS)
+    missing_ids = [
+        str(cid).strip() for cid in selected_ids
+        if str(cid).strip() not in found_ids or str(cid).strip() in stale_ids
+    ]
     
     # 2. Live Fallback for on-demand courses
     live_results = []
@@ -44,28 +80,19 @@ def get_unified_data(selected_ids, selected_names_map, repository, provider):
             
             if specialist_id:
                 with st.spinner(f"🛰️ Buscando dados ao vivo para {course_name}..."):
-                    rows = provider.get_full_history_data(specialist_id)
-                    if rows:
-                        for r in rows:
-                            # Map partial day keys to specific calendar dates
-                            for i in range(1, 5):
-                                day_key, date_str = f"PARCIAL_DIA{i}", f"{19+i}/01"
-                                score = r.get(day_key)
-                                if score:
-                                    live_results.append({
-                                        'curso': course_name.upper().strip(),
-                                        'universidade': str(r.get('SIGLA')).upper().strip(),
-                                        'cidade': str(r.get('MUNICIPIO_CAMPUS')).upper().strip(),
-                                        'uf': str(r.get('SG_UF_CAMPUS')).upper().strip(),
-                                        'date': date_str,
-                                        'score': float(score),
-                                        'fonte': 'LIVE_API',
-                                        'course_id': cid
-                                    })
+                    # Only the session that actually performs the fetch persists it
+                    rows = provider.get_full_history_data(
+                        specialist_id,
+                        on_complete=lambda rows, cid=cid, name=course_name: repository.save_live_history(
+                            live_rows_to_records(rows, cid, name)
+                        )
+                    )
+                    live_results.extend(live_rows_to_records(rows, cid, course_name))
     
     # 3. Data Integration and Cleaning
     df_live = pd.DataFrame(live_results)
-    final_df = pd.concat([df_db, df_live], ignore_index=True) if not df_db.empty or not df_live.empty else pd.DataFrame()
+    # Live rows go first so a refreshed score wins over the stale DB copy on ties
+    final_df = pd.concat([df_live, df_db], ignore_index=True) if not df_db.empty or not df_live.empty else pd.DataFrame()
     
     if not final_df.empty:
         # Force normalization to avoid duplicate rows in pivot table
@@ -73,7 +100,7 @@ def get_unified_data(selected_ids, selected_names_map, repository, provider):
         final_df['cidade'] = final_df['cidade'].str.upper().str.strip()
         
         # Deduplicate prioritizing Live API to correct official SiSU bugs
-        final_df = final_df.sort_values('fonte', ascending=False)
+        final_df = final_df.sort_values('fonte', ascending=False, kind='stable')
         final_df = final_df.drop_duplicates(
             subset=['course_id', 'universidade', 'cidade', 'date'], 
             keep='first'
@@ -86,7 +113,7 @@ def main():
     st.caption("Estratégia Híbrida: SQLite (Top 17) + API Fredão (Sob Demanda)")
 
     repo = SisuRepository()
-    fredao = FredaoProvider()
+    fredao = get_live_provider()
     
     # --- SECTION 1: GLOBAL FILTERS (MAIN PAGE TOP) ---
     st.header("🎯 Seleção de Cursos")
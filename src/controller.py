@@ -60,7 +60,8 @@ class SisuController:
         vacancy_entities.sort(key=lambda x: x.nu_nota_corte if x.nu_nota_corte is not None else float('inf'))
         
         # 4. Delegate persistence to the Repository (DAL)
-        # We save both the incremental CSV and the daily TXT report
+        # SQLite is the source for the daily snapshot delta; CSV and TXT are kept as backups
+        self.repository.save_daily_scores(vacancy_entities, course_id)
         csv_path = self.repository.save_daily_csv(vacancy_entities, course_id)
         self.repository.save_txt_report(vacancy_entities, course_id)
         
@@ -2,14 +2,10 @@ import time
 import os
 import csv
 from datetime import datetime
-from zoneinfo import ZoneInfo
-from repository import SisuRepository, HISTORY_DIR
+from repository import SisuRepository, HISTORY_DIR, BR_TZ
 from providers.official_api import OfficialApiProvider
 from controller import SisuController
 
-# Define Brazil Timezone to ensure consistency across servers
-BR_TZ = ZoneInfo("America/Sao_Paulo")
-
 def run_batch_sync():
     """
     Automates the synchronization of the top 17 SISU courses.
@@ -77,6 +73,13 @@ def run_batch_sync():
             print(f"\n❌ Erro crítico ao sincronizar curso {course_id}: {e}")
             continue 
 
+    # Persist only what changed today as a compact, append-only snapshot segment
+    snapshot_path = repository.export_snapshot_delta(now_br.strftime('%Y%m%d'))
+    if snapshot_path:
+        print(f"📦 Snapshot delta salvo em: {snapshot_path}")
+    else:
+        print("📦 Nenhuma alteração no histórico, snapshot não gerado.")
+
     print("-" * 50)
     print("🏁 Sincronização em lote concluída!")
 
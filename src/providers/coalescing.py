@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from .base import SisuDataProvider
+
+DEFAULT_TTL_SECONDS = 300
+
+
+class _Call:
+    """A fetch in progress: followers block on `done` and reuse the leader's outcome."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class CoalescingProvider(SisuDataProvider):
+    """
+    Single-flight wrapper around another provider.
+    Identical concurrent calls share one upstream request, and non-empty
+    results are kept in a short-lived cache. Share one instance across
+    sessions (e.g. via st.cache_resource) to coalesce process-wide.
+    """
+    def __init__(self, provider: SisuDataProvider, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+
+    # Official API lookups are not coalesced: pass them straight through
+    def get_lista_vagas(self, course_id: str):
+        return self.provider.get_lista_vagas(course_id)
+
+    def get_nota_corte(self, course_id: str):
+        return self.provider.get_nota_corte(course_id)
+
+    def get_full_history_data(
+        self,
+        fredao_course_name: str,
+        on_complete: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Coalesced version of the specialist history fetch.
+        `on_complete` runs once, in the leader thread, before the rows are
+        published to waiters and to the cache (used for DB write-through).
+        """
+        return self._do(
+            fredao_course_name,
+            lambda: self.provider.get_full_history_data(fredao_course_name),
+            on_complete
+        )
+
+    def _do(self, key: Hashable, fetch: Callable[[], Any], on_complete: Optional[Callable[[Any], None]] = None):
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                expires_at, value = cached
+                if expires_at > time.monotonic():
+                    return value
+                del self._cache[key]
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._inflight[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            result = fetch()
+            # Providers swallow errors and return empty values, so only real data is cached
+            if result:
+                if on_complete:
+                    try:
+                        on_complete(result)
+                    except Exception as e:
+                        print(f"❌ Write-through error: {e}")
+                with self._lock:
+                    self._evict_expired()
+                    self._cache[key] = (time.monotonic() + self.ttl_seconds, result)
+            call.result = result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+        return result
+
+    def _evict_expired(self):
+        """Drops expired entries so keys nobody asks for again do not pile up. Caller holds the lock."""
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[key]
@@ -1,20 +1,90 @@
 import sqlite3
 import pandas as pd
 import os
-from typing import List, Dict, Any
+import csv
+import gzip
+import json
+import time
+import tempfile
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from typing import List, Dict, Any, Optional, Tuple
+from models import SisuVacancy
 
 # Standard path configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "..", "data", "sisu_data.db")
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "..", "data", "snapshots")
+HISTORY_DIR = os.path.join(BASE_DIR, "..", "data", "history_backup")
+REPORTS_DIR = os.path.join(BASE_DIR, "..", "data", "reports")
+
+# Brazil timezone, so the "day" of a sync does not depend on the server
+BR_TZ = ZoneInfo("America/Sao_Paulo")
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+CUTOFF_HISTORY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cutoff_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        course_id TEXT NOT NULL,
+        course_name TEXT,
+        university TEXT NOT NULL,
+        city TEXT,
+        uf TEXT,
+        date TEXT NOT NULL,
+        score REAL,
+        source TEXT DEFAULT 'MEC',
+        UNIQUE(course_id, university, city, date)
+    );
+    CREATE INDEX IF NOT EXISTS idx_course_date ON cutoff_history(course_id, date);
+"""
+
+# When each on-demand course was last fetched from the specialist API (epoch seconds)
+LIVE_FETCH_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS live_fetch_log (
+        course_id TEXT PRIMARY KEY,
+        fetched_at REAL NOT NULL
+    );
+"""
+
+# Name of the last snapshot segment folded into this DB
+SNAPSHOT_META_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS snapshot_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+# Snapshot rows: (offer key) + (date) -> attributes and score.
+# Strings are dictionary-encoded; scores are stored as integer hundredths.
+# Deleted rows travel as tombstones (key columns only). A carry (course, from, to)
+# copies every row of a course from one date to another, so a new day only
+# spells out the offers whose values differ from the copied ones.
+_KEY_COLUMNS = ("course_id", "university", "city", "date")
+_VALUE_COLUMNS = ("course_name", "uf", "source")
+_CARRY_COLUMNS = ("course_id", "from_date", "to_date")
+
+# On-demand results are a local cache and are never versioned
+_UNVERSIONED_SOURCE = "LIVE_API"
+
+# Streamlit reruns create a repository per session: only one of them rebuilds
+_rebuild_lock = threading.Lock()
 
 class SisuRepository:
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, snapshot_dir: str = SNAPSHOT_DIR, auto_rebuild: bool = True):
         self.db_path = db_path
+        self.snapshot_dir = snapshot_dir
         self.courses_file = os.path.join(BASE_DIR, "..", "data", "mappings", "cursos.json")
 
+        # Cold start or freshly pulled segments: the DB is not versioned, rebuild it from the deltas
+        if auto_rebuild and self.is_behind_snapshots():
+            with _rebuild_lock:
+                if self.is_behind_snapshots():
+                    self.rebuild_from_snapshots()
+
     def load_courses_mapping(self) -> Dict[str, str]:
         """Loads names and IDs for the Streamlit multiselect."""
-        import json
         if not os.path.exists(self.courses_file): return {}
         with open(self.courses_file, "r", encoding="utf-8") as f:
             raw = json.load(f)
@@ -26,7 +96,6 @@ class SisuRepository:
 
     def load_full_mapping(self) -> Dict[str, Any]:
         """Loads raw JSON to retrieve specialist (fredao) IDs."""
-        import json
         if not os.path.exists(self.courses_file): return {}
         with open(self.courses_file, "r", encoding="utf-8") as f:
             return json.load(f)
@@ -60,4 +129,397 @@ class SisuRepository:
                 return pd.read_sql_query(query, conn, params=params)
         except Exception as e:
             print(f"❌ DB Query Error: {e}")
-            return pd.DataFrame()
\ No newline at end of file
+            return pd.DataFrame()
+
+    def save_daily_scores(self, vacancies: List[SisuVacancy], course_id: str, now: Optional[datetime] = None) -> int:
+        """
+        Upserts today's official scores into cutoff_history (source 'MEC').
+        Only replaces rows coming from MEC or the live cache, never verified/migrated data.
+        """
+        if not vacancies: return 0
+        date_str = (now or datetime.now(BR_TZ)).strftime("%d/%m")
+
+        query = """
+            INSERT INTO cutoff_history
+                (course_id, course_name, university, city, uf, date, score, source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'MEC')
+            ON CONFLICT(course_id, university, city, date) DO UPDATE SET
+                course_name = excluded.course_name,
+                uf = excluded.uf,
+                score = excluded.score,
+                source = excluded.source
+            WHERE cutoff_history.source IN ('MEC', 'LIVE_API')
+        """
+        params = [
+            (str(course_id), v.no_curso, v.sg_ies, v.no_municipio_campus, v.sg_uf_campus, date_str, v.nu_nota_corte)
+            for v in vacancies
+        ]
+        with sqlite3.connect(self.db_path, timeout=10) as conn:
+            conn.executescript(CUTOFF_HISTORY_SCHEMA)
+            return conn.executemany(query, params).rowcount
+
+    def save_daily_csv(self, vacancies: List[SisuVacancy], course_id: str, now: Optional[datetime] = None) -> str:
+        """Incremental CSV backup: one row per offer, one 'nota_dd_mm' column per day."""
+        today_column = f"nota_{(now or datetime.now(BR_TZ)).strftime('%d_%m')}"
+        file_path = os.path.join(HISTORY_DIR, f"historico_sisu_curso_{course_id}.csv")
+
+        rows: Dict[str, Dict[str, Any]] = {}
+        header = ["co_oferta", "curso", "universidade", "cidade", "uf"]
+
+        # 1. Preserve previous days
+        if os.path.exists(file_path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                reader = csv.DictReader(f)
+                header = list(reader.fieldnames or header)
+                for line in reader:
+                    rows[line["co_oferta"]] = line
+
+        if today_column not in header:
+            header.append(today_column)
+
+        # 2. Merge today's scores (co_oferta is the key)
+        for v in vacancies:
+            key = str(v.co_oferta)
+            if key not in rows:
+                rows[key] = {
+                    "co_oferta": key, "curso": v.no_curso, "universidade": v.sg_ies,
+                    "cidade": v.no_municipio_campus, "uf": v.sg_uf_campus
+                }
+            rows[key][today_column] = v.nu_nota_corte if v.nu_nota_corte is not None else "N/A"
+
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(sorted(rows.values(), key=lambda r: r.get("universidade") or ""))
+        return file_path
+
+    def save_txt_report(self, vacancies: List[SisuVacancy], course_id: str, now: Optional[datetime] = None) -> str:
+        """Human-readable daily report (overwritten on every sync)."""
+        now = now or datetime.now(BR_TZ)
+        file_path = os.path.join(REPORTS_DIR, f"sisu_notas_curso_{course_id}.txt")
+
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(f"NOTAS DE CORTE - CURSO ID {course_id} | GERADO EM: {now.strftime('%d/%m/%Y %H:%M')}\n")
+            f.write("=" * 70 + "\n")
+            f.write(f"{'IES':<10} | {'CIDADE':<25} | {'UF':<3} | {'NOTA'}\n")
+            f.write("-" * 70 + "\n")
+            for v in vacancies:
+                score = f"{v.nu_nota_corte:.2f}" if v.nu_nota_corte is not None else "N/A"
+                f.write(f"{v.sg_ies or '':<10} | {(v.no_municipio_campus or '')[:25]:<25} | {v.sg_uf_campus or '':<3} | {score}\n")
+        return file_path
+
+    def get_stale_live_course_ids(self, course_ids: List[str], max_age_seconds: float) -> List[str]:
+        """
+        Returns the courses that only have 'LIVE_API' rows and were fetched
+        more than `max_age_seconds` ago, so the caller can refresh them.
+        """
+        if not course_ids: return []
+
+        placeholders = ','.join(['?'] * len(course_ids))
+        query = f"""
+            SELECT TRIM(CAST(h.course_id AS TEXT))
+            FROM cutoff_history h
+            LEFT JOIN live_fetch_log l ON l.course_id = h.course_id
+            WHERE TRIM(CAST(h.course_id AS TEXT)) IN ({placeholders})
+            GROUP BY h.course_id
+            HAVING SUM(COALESCE(h.source, '') != 'LIVE_API') = 0
+               AND COALESCE(MAX(l.fetched_at), 0) < ?
+        """
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                params = [str(cid).strip() for cid in course_ids] + [time.time() - max_age_seconds]
+                return [row[0] for row in conn.execute(query, params)]
+        except sqlite3.OperationalError:
+            # No live write-through happened yet (tables created by save_live_history/rebuild)
+            return []
+        except Exception as e:
+            print(f"❌ DB Query Error: {e}")
+            return []
+
+    def save_live_history(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Write-through for on-demand API results (tagged 'LIVE_API').
+        Refreshes earlier 'LIVE_API' rows, but never overwrites data from other sources.
+        """
+        if not records: return 0
+
+        query = """
+            INSERT INTO cutoff_history
+                (course_id, course_name, university, city, uf, date, score, source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'LIVE_API')
+            ON CONFLICT(course_id, university, city, date) DO UPDATE SET
+                course_name = excluded.course_name,
+                uf = excluded.uf,
+                score = excluded.score
+            WHERE cutoff_history.source = 'LIVE_API'
+        """
+        params = [
+            (r['course_id'], r['curso'], r['universidade'], r['cidade'], r['uf'], r['date'], r['score'])
+            for r in records
+        ]
+        fetched_at = time.time()
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                # The DB may have been created empty (no snapshots yet)
+                conn.executescript(CUTOFF_HISTORY_SCHEMA + LIVE_FETCH_SCHEMA)
+                cursor = conn.executemany(query, params)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO live_fetch_log (course_id, fetched_at) VALUES (?, ?)",
+                    [(cid, fetched_at) for cid in {r['course_id'] for r in records}]
+                )
+                return cursor.rowcount
+        except Exception as e:
+            print(f"❌ DB Write Error: {e}")
+            return 0
+
+    # --- COMPACT SNAPSHOTS (append-only daily deltas) ---
+
+    def is_behind_snapshots(self) -> bool:
+        """True when the snapshot directory has segments this DB has not applied yet."""
+        segments = self._list_snapshots()
+        if not segments: return False
+        return self._get_applied_snapshot() != os.path.basename(segments[-1])
+
+    def export_snapshot_delta(self, label: Optional[str] = None) -> Optional[str]:
+        """
+        Writes only the (offer, date) rows that changed since the last snapshot,
+        plus tombstones for rows that were deleted. A new day is carried forward
+        from the closest committed day, so unchanged scores cost nothing.
+        'LIVE_API' rows are skipped. Returns the new segment path, or None when nothing changed.
+        """
+        if self.is_behind_snapshots():
+            raise RuntimeError("DB is behind the snapshot directory; rebuild it before exporting.")
+
+        committed, _ = self._replay_snapshots()
+        with sqlite3.connect(self.db_path) as conn:
+            current = {row[:4]: row[4:-1] + (_normalize_score(row[-1]),) for row in conn.execute(f"""
+                SELECT {', '.join(_KEY_COLUMNS + _VALUE_COLUMNS)}, score
+                FROM cutoff_history
+                WHERE COALESCE(source, '') != ?
+            """, (_UNVERSIONED_SOURCE,))}
+
+        carries = _plan_carries(committed, current)
+        base = _SnapshotState(committed)
+        for carry in carries:
+            base.carry(*carry)
+
+        sort_key = lambda row: tuple("" if v is None else str(v) for v in row)
+        changed = sorted((key + value for key, value in current.items() if base.rows.get(key) != value), key=sort_key)
+        deleted = sorted((key for key in base.rows if key not in current), key=sort_key)
+        if not changed and not deleted: return None
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        seq = len(self._list_snapshots()) + 1
+        label = label or datetime.now(BR_TZ).strftime("%Y%m%d")
+        path = os.path.join(self.snapshot_dir, f"{seq:05d}_{label}.json.gz")
+
+        # Write aside and rename, so a crash never leaves a truncated segment behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                f.write(json.dumps(_encode_rows(changed, deleted, carries), separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+        with sqlite3.connect(self.db_path) as conn:
+            _set_applied_snapshot(conn, os.path.basename(path))
+        return path
+
+    def rebuild_from_snapshots(self) -> int:
+        """
+        Recreates the SQLite DB by replaying every snapshot segment in order.
+        Local-only rows (e.g. 'LIVE_API' cache) are dropped.
+        """
+        state, last_segment = self._replay_snapshots()
+        rows = [key + value for key, value in state.items()]
+
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        fd, tmp_path = tempfile.mkstemp(dir=db_dir, prefix=".sisu_rebuild_", suffix=".tmp")
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(tmp_path)
+            try:
+                conn.executescript(CUTOFF_HISTORY_SCHEMA + SNAPSHOT_META_SCHEMA + LIVE_FETCH_SCHEMA)
+                conn.executemany(f"""
+                    INSERT INTO cutoff_history ({', '.join(_KEY_COLUMNS + _VALUE_COLUMNS)}, score)
+                    VALUES ({', '.join(['?'] * (len(_KEY_COLUMNS) + len(_VALUE_COLUMNS) + 1))})
+                """, rows)
+                if last_segment:
+                    _set_applied_snapshot(conn, last_segment)
+                conn.commit()
+            finally:
+                conn.close()
+
+            # Atomic swap so readers never see a half-built DB
+            os.replace(tmp_path, self.db_path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+        return len(rows)
+
+    def _get_applied_snapshot(self) -> Optional[str]:
+        if not os.path.exists(self.db_path): return None
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute("SELECT value FROM snapshot_meta WHERE key = 'last_segment'").fetchone()
+                return row[0] if row else None
+        except sqlite3.OperationalError:
+            # Legacy or empty DB without snapshot_meta
+            return None
+
+    def _list_snapshots(self) -> List[str]:
+        if not os.path.isdir(self.snapshot_dir): return []
+        return sorted(
+            os.path.join(self.snapshot_dir, name)
+            for name in os.listdir(self.snapshot_dir) if name.endswith(".json.gz")
+        )
+
+    def _replay_snapshots(self) -> Tuple[Dict[Tuple, Tuple], Optional[str]]:
+        """
+        Folds all segments into {(course_id, university, city, date): (course_name, uf, source, score)}.
+        Also returns the name of the last segment applied.
+        """
+        state = _SnapshotState()
+        last_segment = None
+        for path in self._list_snapshots():
+            with gzip.open(path, "rb") as f:
+                payload = json.loads(f.read().decode("utf-8"))
+            # Carries copy the state as of the previous segment, then rows and tombstones apply
+            rows, deleted, carries = _decode_rows(payload)
+            for carry in carries:
+                state.carry(*carry)
+            for row in rows:
+                state.put(row[:4], row[4:])
+            for key in deleted:
+                state.drop(key)
+            last_segment = os.path.basename(path)
+        return state.rows, last_segment
+
+
+class _SnapshotState:
+    """Replayed rows plus a (course_id, date) index, so carries do not scan the whole history."""
+    def __init__(self, rows: Optional[Dict[Tuple, Tuple]] = None):
+        self.rows: Dict[Tuple, Tuple] = {}
+        self.groups: Dict[Tuple[str, str], set] = {}
+        for key, value in (rows or {}).items():
+            self.put(key, value)
+
+    def put(self, key: Tuple, value: Tuple):
+        self.rows[key] = value
+        self.groups.setdefault((key[0], key[3]), set()).add(key)
+
+    def drop(self, key: Tuple):
+        self.rows.pop(key, None)
+        self.groups.get((key[0], key[3]), set()).discard(key)
+
+    def carry(self, course_id: str, from_date: str, to_date: str):
+        for key in list(self.groups.get((course_id, from_date), ())):
+            self.put((course_id, key[1], key[2], to_date), self.rows[key])
+
+
+def _group_by_course_date(rows: Dict[Tuple, Tuple]) -> Dict[Tuple[str, str], Dict[Tuple, Tuple]]:
+    """{(course_id, date): {(university, city): value}}"""
+    groups: Dict[Tuple[str, str], Dict[Tuple, Tuple]] = {}
+    for key, value in rows.items():
+        groups.setdefault((key[0], key[3]), {})[(key[1], key[2])] = value
+    return groups
+
+
+def _plan_carries(committed: Dict[Tuple, Tuple], current: Dict[Tuple, Tuple]) -> List[Tuple[str, str, str]]:
+    """
+    For every (course, date) that is new since the last snapshot, picks the committed
+    date of the same course that saves the most rows: each offer with an identical
+    value is free, each copied offer missing on the new date costs a tombstone.
+    """
+    committed_groups = _group_by_course_date(committed)
+    current_groups = _group_by_course_date(current)
+    dates_by_course: Dict[str, List[str]] = {}
+    for course_id, date in sorted(committed_groups):
+        dates_by_course.setdefault(course_id, []).append(date)
+
+    carries = []
+    for (course_id, date), offers in sorted(current_groups.items()):
+        if (course_id, date) in committed_groups: continue
+
+        best_source, best_gain = None, 0
+        for source_date in dates_by_course.get(course_id, []):
+            source = committed_groups[(course_id, source_date)]
+            matches = sum(1 for offer, value in source.items() if offers.get(offer) == value)
+            missing = sum(1 for offer in source if offer not in offers)
+            if matches - missing > best_gain:
+                best_source, best_gain = source_date, matches - missing
+        if best_source is not None:
+            carries.append((course_id, best_source, date))
+    return carries
+
+
+def _set_applied_snapshot(conn: sqlite3.Connection, segment: str):
+    conn.executescript(SNAPSHOT_META_SCHEMA)
+    conn.execute("INSERT OR REPLACE INTO snapshot_meta (key, value) VALUES ('last_segment', ?)", (segment,))
+
+
+def _normalize_score(score: Optional[float]) -> Optional[float]:
+    """Same precision the encoder keeps, so DB and replayed values compare equal."""
+    return None if score is None else round(score * 100) / 100
+
+
+def _encode_rows(rows: List[Tuple], deleted: List[Tuple], carries: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+    """Columnar layout: one shared string dictionary, -1 marks NULL."""
+    strings: List[str] = []
+    index: Dict[str, int] = {}
+
+    def encode(value):
+        if value is None: return -1
+        if value not in index:
+            index[value] = len(strings)
+            strings.append(value)
+        return index[value]
+
+    names = _KEY_COLUMNS + _VALUE_COLUMNS
+    columns = {name: [encode(row[i]) for row in rows] for i, name in enumerate(names)}
+    columns["score"] = [None if row[-1] is None else round(row[-1] * 100) for row in rows]
+    tombstones = {name: [encode(key[i]) for key in deleted] for i, name in enumerate(_KEY_COLUMNS)}
+    carry_columns = {name: [encode(carry[i]) for carry in carries] for i, name in enumerate(_CARRY_COLUMNS)}
+    return {
+        "version": SNAPSHOT_FORMAT_VERSION,
+        "rows": len(rows),
+        "deleted": len(deleted),
+        "carried": len(carries),
+        "strings": strings,
+        "carries": carry_columns,
+        "columns": columns,
+        "tombstones": tombstones
+    }
+
+
+def _decode_rows(payload: Dict[str, Any]) -> Tuple[List[Tuple], List[Tuple], List[Tuple]]:
+    if payload.get("version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {payload.get('version')}")
+
+    strings, columns = payload["strings"], payload["columns"]
+    # Tombstones and carries are optional: the baseline segment predates them
+    tombstones = payload.get("tombstones", {name: [] for name in _KEY_COLUMNS})
+    carry_columns = payload.get("carries", {name: [] for name in _CARRY_COLUMNS})
+    expected = {name: payload["rows"] for name in _KEY_COLUMNS + _VALUE_COLUMNS + ("score",)}
+    for name, size in expected.items():
+        if len(columns.get(name, [])) != size:
+            raise ValueError(f"Corrupted snapshot: column '{name}' does not have {size} rows")
+    for name in _KEY_COLUMNS:
+        if len(tombstones.get(name, [])) != payload.get("deleted", 0):
+            raise ValueError(f"Corrupted snapshot: tombstone column '{name}' has the wrong size")
+    for name in _CARRY_COLUMNS:
+        if len(carry_columns.get(name, [])) != payload.get("carried", 0):
+            raise ValueError(f"Corrupted snapshot: carry column '{name}' has the wrong size")
+
+    def strs(indexes):
+        return [None if i < 0 else strings[i] for i in indexes]
+
+    decoded = [strs(columns[name]) for name in _KEY_COLUMNS + _VALUE_COLUMNS]
+    decoded.append([None if v is None else v / 100 for v in columns["score"]])
+    deleted = list(zip(*[strs(tombstones[name]) for name in _KEY_COLUMNS]))
+    carries = list(zip(*[strs(carry_columns[name]) for name in _CARRY_COLUMNS]))
+    return list(zip(*decoded)), deleted, carries
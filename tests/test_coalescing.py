@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from providers.base import SisuDataProvider  # noqa: E402
+from providers.coalescing import CoalescingProvider  # noqa: E402
+
+CALLERS = 8
+
+
+class FakeProvider(SisuDataProvider):
+    """Slow upstream: keeps the leader in flight long enough for followers to pile up."""
+    def __init__(self, rows=None, error=None, delay=0.2):
+        self.rows = rows if rows is not None else [{"SIGLA": "UFX"}]
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_lista_vagas(self, course_id):
+        return ["vaga"]
+
+    def get_nota_corte(self, course_id):
+        return 700.0
+
+    def get_full_history_data(self, fredao_course_name):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.rows
+
+
+def run_concurrently(fn, n=CALLERS):
+    results, errors = [], []
+    barrier = threading.Barrier(n)
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return results, errors
+
+
+def test_concurrent_callers_share_one_upstream_call():
+    upstream = FakeProvider()
+    provider = CoalescingProvider(upstream)
+    completed = []
+
+    results, errors = run_concurrently(
+        lambda: provider.get_full_history_data("PSICOLOGIA", on_complete=completed.append)
+    )
+
+    assert upstream.calls == 1
+    assert errors == []
+    assert results == [upstream.rows] * CALLERS
+    assert completed == [upstream.rows]
+
+
+def test_followers_receive_the_leader_exception():
+    upstream = FakeProvider(error=RuntimeError("upstream down"))
+    provider = CoalescingProvider(upstream)
+
+    results, errors = run_concurrently(lambda: provider.get_full_history_data("PSICOLOGIA"))
+
+    assert upstream.calls == 1
+    assert results == []
+    assert len(errors) == CALLERS
+    assert all(str(e) == "upstream down" for e in errors)
+
+
+def test_empty_results_are_not_cached():
+    upstream = FakeProvider(rows=[], delay=0)
+    provider = CoalescingProvider(upstream)
+    completed = []
+
+    assert provider.get_full_history_data("PSICOLOGIA", on_complete=completed.append) == []
+    assert provider.get_full_history_data("PSICOLOGIA") == []
+    assert upstream.calls == 2
+    assert completed == []
+
+
+def test_entries_expire_and_are_evicted():
+    upstream = FakeProvider(delay=0)
+    provider = CoalescingProvider(upstream, ttl_seconds=0.05)
+
+    for i in range(5):
+        provider.get_full_history_data(f"CURSO {i}")
+    provider.get_full_history_data("CURSO 0")
+    assert upstream.calls == 5
+
+    time.sleep(0.1)
+    provider.get_full_history_data("CURSO 0")
+    assert upstream.calls == 6
+    assert list(provider._cache) == ["CURSO 0"]
+
+
+def test_official_lookups_pass_through():
+    upstream = FakeProvider()
+    provider = CoalescingProvider(upstream)
+
+    assert provider.get_lista_vagas("44") == ["vaga"]
+    assert provider.get_nota_corte("123") == pytest.approx(700.0)
+    assert provider._cache == {}
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from repository import SisuRepository  # noqa: E402
+
+
+@pytest.fixture
+def repo(tmp_path):
+    # Empty snapshot dir: the DB starts without any table
+    return SisuRepository(str(tmp_path / "sisu_data.db"), str(tmp_path / "snapshots"))
+
+
+def live_record(course_id="999", score=700.0, university="UFX"):
+    return {
+        "course_id": course_id, "curso": "PSICOLOGIA", "universidade": university,
+        "cidade": "CIDADE", "uf": "SP", "date": "20/01", "score": score
+    }
+
+
+def scores(repo):
+    with sqlite3.connect(repo.db_path) as conn:
+        return conn.execute("SELECT university, score, source FROM cutoff_history ORDER BY university").fetchall()
+
+
+def test_write_through_creates_schema_on_empty_db(repo):
+    assert repo.save_live_history([live_record()]) == 1
+    assert scores(repo) == [("UFX", 700.0, "LIVE_API")]
+
+
+def test_live_rows_are_refreshed_but_other_sources_are_not(repo):
+    repo.save_live_history([live_record(university="UFX"), live_record(university="UFY")])
+    with sqlite3.connect(repo.db_path) as conn:
+        conn.execute("UPDATE cutoff_history SET source = 'FREDAO_VERIFIED', score = 650.0 WHERE university = 'UFY'")
+
+    repo.save_live_history([live_record(university="UFX", score=710.0), live_record(university="UFY", score=710.0)])
+
+    assert scores(repo) == [("UFX", 710.0, "LIVE_API"), ("UFY", 650.0, "FREDAO_VERIFIED")]
+
+
+def test_stale_query_before_any_write_through(repo):
+    assert repo.get_stale_live_course_ids(["999"], 60) == []
+
+
+def test_stale_query_only_returns_old_live_only_courses(repo):
+    repo.save_live_history([live_record(course_id="999"), live_record(course_id="44")])
+    with sqlite3.connect(repo.db_path) as conn:
+        # Course 44 also has verified data, so it is never refreshed live
+        conn.execute("UPDATE cutoff_history SET source = 'FREDAO_VERIFIED' WHERE course_id = '44'")
+
+    assert repo.get_stale_live_course_ids(["999", "44"], 60) == []
+
+    with sqlite3.connect(repo.db_path) as conn:
+        conn.execute("UPDATE live_fetch_log SET fetched_at = ?", (time.time() - 120,))
+
+    assert repo.get_stale_live_course_ids(["999", "44"], 60) == ["999"]
@@ -0,0 +1,122 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from repository import SisuRepository, SNAPSHOT_DIR  # noqa: E402
+
+BASELINE_ROWS = 9484
+
+
+@pytest.fixture
+def repo(tmp_path):
+    snapshot_dir = tmp_path / "snapshots"
+    shutil.copytree(SNAPSHOT_DIR, snapshot_dir)
+    return SisuRepository(str(tmp_path / "sisu_data.db"), str(snapshot_dir))
+
+
+def read_segment(path):
+    with gzip.open(path, "rb") as f:
+        return json.loads(f.read().decode("utf-8"))
+
+
+def execute(repo, query, params=()):
+    with sqlite3.connect(repo.db_path) as conn:
+        conn.execute(query, params)
+
+
+def test_baseline_rebuilds_original_rows(repo):
+    with sqlite3.connect(repo.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cutoff_history").fetchone()[0] == BASELINE_ROWS
+        row = conn.execute("""
+            SELECT course_name, uf, score, source FROM cutoff_history
+            WHERE course_id = '1806' AND university = 'FURG'
+              AND city = 'Santo Antônio da Patrulha' AND date = '21/01'
+        """).fetchone()
+    assert row == ("ENGENHARIA DE PRODUÇÃO", "RS", 600.7, "MEC_MIGRATED")
+    assert not repo.is_behind_snapshots()
+
+
+def test_export_without_changes_returns_none(repo):
+    assert repo.export_snapshot_delta("20260101") is None
+
+
+def test_changed_row_produces_one_row_segment(repo):
+    execute(repo, "UPDATE cutoff_history SET score = 701.5 WHERE id = 1")
+
+    path = repo.export_snapshot_delta("20260101")
+    payload = read_segment(path)
+    assert payload["rows"] == 1
+    assert payload["deleted"] == 0
+    assert payload["columns"]["score"] == [70150]
+    assert repo.export_snapshot_delta("20260102") is None
+
+
+def test_deleted_row_is_exported_as_tombstone(repo, tmp_path):
+    execute(repo, "DELETE FROM cutoff_history WHERE id = 1")
+    payload = read_segment(repo.export_snapshot_delta("20260101"))
+    assert (payload["rows"], payload["deleted"]) == (0, 1)
+
+    rebuilt = SisuRepository(str(tmp_path / "rebuilt.db"), repo.snapshot_dir)
+    with sqlite3.connect(rebuilt.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cutoff_history").fetchone()[0] == BASELINE_ROWS - 1
+
+
+def test_live_rows_and_extra_precision_are_not_exported(repo):
+    repo.save_live_history([{
+        "course_id": "999", "curso": "X", "universidade": "U", "cidade": "C",
+        "uf": "SP", "date": "20/01", "score": 700.0
+    }])
+    execute(repo, "UPDATE cutoff_history SET score = score + 0.001 WHERE id = (SELECT MIN(id) FROM cutoff_history WHERE score IS NOT NULL)")
+    assert repo.export_snapshot_delta("20260101") is None
+
+
+def test_stale_db_is_detected(repo, tmp_path):
+    stale_path = str(tmp_path / "stale.db")
+    shutil.copy(repo.db_path, stale_path)
+
+    execute(repo, "UPDATE cutoff_history SET score = 701.5 WHERE id = 1")
+    assert repo.export_snapshot_delta("20260101")
+
+    stale = SisuRepository(stale_path, repo.snapshot_dir, auto_rebuild=False)
+    assert stale.is_behind_snapshots()
+    with pytest.raises(RuntimeError):
+        stale.export_snapshot_delta("20260102")
+
+    # A regular instance catches up on construction
+    refreshed = SisuRepository(stale_path, repo.snapshot_dir)
+    assert not refreshed.is_behind_snapshots()
+    with sqlite3.connect(stale_path) as conn:
+        assert conn.execute("SELECT score FROM cutoff_history WHERE score = 701.5").fetchone()
+
+
+def test_new_day_with_unchanged_scores_is_carried_forward(repo, tmp_path):
+    # Simulates a daily sync: course 1806 gets a new day identical to 21/01, except one offer
+    with sqlite3.connect(repo.db_path) as conn:
+        conn.execute("""
+            INSERT INTO cutoff_history (course_id, course_name, university, city, uf, date, score, source)
+            SELECT course_id, course_name, university, city, uf, '26/01', score, source
+            FROM cutoff_history WHERE course_id = '1806' AND date = '21/01'
+        """)
+        copied = conn.execute("SELECT COUNT(*) FROM cutoff_history WHERE date = '26/01'").fetchone()[0]
+        conn.execute("""
+            UPDATE cutoff_history SET score = 601.0
+            WHERE course_id = '1806' AND university = 'FURG' AND city = 'Santo Antônio da Patrulha' AND date = '26/01'
+        """)
+
+    payload = read_segment(repo.export_snapshot_delta("20260126"))
+    assert copied > 1
+    assert payload["carried"] == 1
+    assert (payload["rows"], payload["deleted"]) == (1, 0)
+    assert payload["columns"]["score"] == [60100]
+
+    rebuilt = SisuRepository(str(tmp_path / "rebuilt.db"), repo.snapshot_dir)
+    query = "SELECT course_id, university, city, date, score, source FROM cutoff_history ORDER BY 1, 2, 3, 4"
+    with sqlite3.connect(repo.db_path) as original, sqlite3.connect(rebuilt.db_path) as conn:
+        assert conn.execute(query).fetchall() == original.execute(query).fetchall()